@@ -1,17 +1,29 @@
+import functools
+import hashlib
 import json
-import sys
+import logging
+import re
 import os
+import threading
+import uuid
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-import google as google
+import orjson
 import requests.exceptions
+from cachetools import TTLCache
+from google.auth import default as _google_auth_default
+from google.auth.transport.requests import AuthorizedSession
 from google.api_core.exceptions import BadRequest, Forbidden
-from google.api_core.retry import if_exception_type, if_transient_error
+from google.api_core.retry import if_transient_error
 from google.cloud import bigquery
-from google.cloud.bigquery.job import QueryJobConfig, CreateDisposition
+from google.cloud.bigquery._helpers import _int_or_none, _rows_from_json
+from google.cloud.bigquery.job import QueryJob, QueryJobConfig, QueryPriority, CreateDisposition
 from google.cloud.bigquery.schema import _parse_schema_resource
 from google.cloud.bigquery.table import TimePartitioningType, TimePartitioning, TableReference, Table
 from google.cloud.exceptions import GoogleCloudError
+from requests.adapters import HTTPAdapter
 
 from bumblebee.config import TaskConfigFromEnv
 from bumblebee.log import get_logger
@@ -21,6 +33,36 @@ logger = get_logger(__name__)
 SERVICE_ACCOUNT_VAR = "BQ_SERVICE_ACCOUNT"
 SERVICE_ACCOUNT_TYPE = "service_account"
 
+TABLE_CACHE_MAXSIZE = 1024
+TABLE_CACHE_TTL_IN_SECONDS = 300
+QUERY_TIMEOUT_IN_MS = 10000
+TRANSFORM_LOAD_POLL_TIMEOUT_IN_MS = 60000
+HTTP_POOL_CONNECTIONS = 20
+HTTP_POOL_MAXSIZE = 50
+MAX_TABLE_REQUEST_WORKERS = 16
+DEFAULT_MAX_CONCURRENT_QUERIES = 8
+RESULT_CACHE_MAXSIZE = 128
+# rows fetched per tabledata.list request when iterating query results
+RESULT_PAGE_SIZE = 10000
+# jobs.query response fields that are also the job's query statistics
+QUERY_RESPONSE_STATISTICS = ("totalBytesProcessed", "totalBytesBilled", "totalSlotMs", "numDmlAffectedRows", "cacheHit")
+
+# only single read statements without time or randomness dependent functions give reusable results
+CACHEABLE_QUERY_PATTERN = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+# statements that already are scripts can not be nested inside another script
+SCRIPT_QUERY_PATTERN = re.compile(r"^\s*(declare|begin)\b", re.IGNORECASE)
+NON_DETERMINISTIC_QUERY_PATTERN = re.compile(
+    r"\b(current_(timestamp|date|datetime|time)|rand|generate_uuid|session_user)\s*\(", re.IGNORECASE)
+
+# credentials and clients are shared by every service created in this process
+_CREDENTIALS_CACHE = None
+_CLIENT_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+class BigqueryJobError(RuntimeError):
+    """Raised when a bigquery job fails, the error message is also written to the task output."""
+
 
 class BaseBigqueryService(ABC):
 
@@ -28,6 +70,10 @@ class BaseBigqueryService(ABC):
     def execute_query(self, query):
         pass
 
+    @abstractmethod
+    def execute_queries(self, queries):
+        pass
+
     @abstractmethod
     def transform_load(self,
                        query,
@@ -38,6 +84,10 @@ class BaseBigqueryService(ABC):
                        allow_field_addition=False):
         pass
 
+    @abstractmethod
+    def transform_load_many(self, jobs, max_concurrent=DEFAULT_MAX_CONCURRENT_QUERIES):
+        pass
+
     @abstractmethod
     def create_table(self, full_table_name, schema_file,
                      partitioning_type=TimePartitioningType.DAY,
@@ -52,14 +102,28 @@ class BaseBigqueryService(ABC):
     def get_table(self, full_table_name):
         pass
 
-def if_exception_funcs(fn_origin, fn_additional):
-    def if_exception_func_predicate(exception):
-        return fn_origin(exception) or fn_additional(exception)
-    return if_exception_func_predicate
+    @abstractmethod
+    def get_tables(self, full_table_names):
+        pass
+
+    @abstractmethod
+    def delete_tables(self, full_table_names):
+        pass
+
+_ADDITIONAL_TRANSIENT_ERRORS = (
+    requests.exceptions.Timeout,
+    requests.exceptions.SSLError,
+)
+
+
+def _is_transient_error(exception):
+    """Shared by every service, request timeouts and ssl errors are retried on top of api_core's transient errors."""
+    return isinstance(exception, _ADDITIONAL_TRANSIENT_ERRORS) or if_transient_error(exception)
 
 class BigqueryService(BaseBigqueryService):
 
-    def __init__(self, client, labels, writer, retry_timeout = None, on_job_finish = None, on_job_register = None):
+    def __init__(self, client, labels, writer, retry_timeout = None, on_job_finish = None, on_job_register = None,
+                 bqstorage_client = None, result_cache_ttl = None):
         """
 
         :rtype:
@@ -67,51 +131,236 @@ class BigqueryService(BaseBigqueryService):
         self.client = client
         self.labels = labels
         self.writer = writer
-        if_additional_transient_error = if_exception_type(
-            requests.exceptions.Timeout,
-            requests.exceptions.SSLError,
-        )
-        predicate = if_exception_funcs(if_transient_error, if_additional_transient_error)
         retry = bigquery.DEFAULT_RETRY.with_deadline(retry_timeout) if retry_timeout else bigquery.DEFAULT_RETRY
-        self.retry = retry.with_predicate(predicate)
+        self.retry = retry.with_predicate(_is_transient_error)
         self.on_job_finish = on_job_finish
         self.on_job_register = on_job_register
+        self.bqstorage_client = bqstorage_client
+        self._base_query_cfg = QueryJobConfig(use_legacy_sql=False, labels=labels)
+        self._base_load_cfg_no_fa = QueryJobConfig(use_legacy_sql=False, labels=labels)
+        self._base_load_cfg_fa = QueryJobConfig(use_legacy_sql=False, labels=labels, schema_update_options=[
+            bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION,
+            bigquery.SchemaUpdateOption.ALLOW_FIELD_RELAXATION
+        ])
+        self._table_cache = TTLCache(maxsize=TABLE_CACHE_MAXSIZE, ttl=TABLE_CACHE_TTL_IN_SECONDS)
+        self._table_cache_lock = threading.RLock()
+        self._result_cache = TTLCache(maxsize=RESULT_CACHE_MAXSIZE, ttl=result_cache_ttl) if result_cache_ttl else None
+        self._pending_results = {}
+        self._result_cache_lock = threading.Lock()
 
     def execute_query(self, query):
-        query_job_config = QueryJobConfig()
-        query_job_config.use_legacy_sql = False
-        query_job_config.labels = self.labels
+        if not query:
+            raise ValueError("query must not be Empty")
+
+        if self._result_cache is None or not _is_cacheable_query(query):
+            return self._run_query(query)
+
+        key = hashlib.blake2b(query.strip().encode(), digest_size=16).digest()
+        while True:
+            with self._result_cache_lock:
+                result = self._result_cache.get(key)
+                if result is not None:
+                    logger.info("using cached result of an identical query")
+                    return result
+                pending = self._pending_results.get(key)
+                if pending is None:
+                    self._pending_results[key] = threading.Event()
+                    break
+            # the same query is already running on another thread, wait for it to fill the cache
+            pending.wait()
 
-        if query is None or len(query) == 0:
+        try:
+            result = self._run_query(query)
+            result = QueryResult(list(result), result.schema, result.query_job, self._get_bqstorage_client,
+                                 result.total_rows)
+            with self._result_cache_lock:
+                self._result_cache[key] = result
+            return result
+        finally:
+            with self._result_cache_lock:
+                self._pending_results.pop(key).set()
+
+    def _run_query(self, query):
+        default_query_job_config = self.client._default_query_job_config
+        if default_query_job_config is not None and default_query_job_config.priority == QueryPriority.BATCH:
+            # jobs.query only runs interactive queries, batch priority has to go through jobs.insert
+            return self._execute_query_job(query)
+
+        logger.info("executing query")
+        try:
+            response = self._post_query(query)
+        except (GoogleCloudError, Forbidden, BadRequest) as ex:
+            self.writer.write("error", ex.message)
+            logger.error(ex)
+            raise BigqueryJobError(ex.message) from ex
+
+        job_reference = response.get("jobReference", {})
+        if "jobId" not in job_reference:
+            logger.info("Query %s completed without job creation", response.get("queryId"))
+            logger.info("Bytes processed: %s, Affected Rows: %s, Bytes billed: %s", response.get("totalBytesProcessed"),
+                        response.get("numDmlAffectedRows"), response.get("totalBytesBilled"))
+            return QueryResult(_rows_from_query_response(response), _schema_from_query_response(response), None,
+                               self._get_bqstorage_client, _int_or_none(response.get("totalRows")))
+
+        # jobs.query does not return the job status, it is only logged from jobComplete and never set on the job
+        # so that result() still checks the job for errors
+        query_job = QueryJob.from_api_repr({"jobReference": job_reference,
+                                            "configuration": {"query": {"query": query}, "labels": self.labels},
+                                            "statistics": {"query": _statistics_from_query_response(response)}},
+                                           self.client)
+        state = "DONE" if response.get("jobComplete") else "RUNNING"
+        self._log_job(query_job, "initially", state)
+
+        if self.on_job_register:
+            # the job is only known once jobs.query returns, it can not be cancelled while the request is open
+            self.on_job_register(self.client, query_job)
+
+        try:
+            total_rows = None
+            if response.get("jobComplete") and "pageToken" not in response:
+                # the response already holds every row and the job statistics, the job is not reloaded
+                result = _rows_from_query_response(response)
+                total_rows = _int_or_none(response.get("totalRows"))
+            else:
+                if not response.get("jobComplete"):
+                    self._wait_for_job(query_job, QUERY_TIMEOUT_IN_MS)
+                query_job.reload(retry=self.retry)
+                state = query_job.state
+                result = query_job.result(page_size=RESULT_PAGE_SIZE, retry=self.retry)
+        except (GoogleCloudError, Forbidden, BadRequest) as ex:
+            self.writer.write("error", ex.message)
+            logger.error(ex)
+            raise BigqueryJobError(ex.message) from ex
+
+        self._log_job(query_job, "finally", state)
+
+        if self.on_job_finish is not None:
+            self.on_job_finish(query_job)
+        return QueryResult(result, None, query_job, self._get_bqstorage_client, total_rows)
+
+    def execute_queries(self, queries):
+        """Runs the queries as one multi statement script and returns a result per query.
+
+        Queries that can not be combined into a script are submitted individually and concurrently instead.
+        """
+        if not queries:
+            return []
+        if any(not query or not query.strip() for query in queries):
             raise ValueError("query must not be Empty")
+        if len(queries) == 1:
+            return [self.execute_query(queries[0])]
+        if not _can_run_as_script(queries):
+            with ThreadPoolExecutor(max_workers=min(DEFAULT_MAX_CONCURRENT_QUERIES, len(queries))) as executor:
+                return list(executor.map(self.execute_query, queries))
+
+        # separator on its own line so a trailing line comment can not swallow it
+        script = "\n;\n".join(query.strip().rstrip(";") for query in queries)
+        logger.info("executing %s queries as a script", len(queries))
+        query_job = self.client.query(query=script,
+                                      job_config=self._base_query_cfg,
+                                      retry=self.retry)
+        self._log_job(query_job, "initially")
+
+        if self.on_job_register:
+            self.on_job_register(self.client, query_job)
+
+        try:
+            query_job.result(retry=self.retry)
+            # every statement of the script runs as a child job, listed newest first
+            child_jobs = sorted(self.client.list_jobs(parent_job=query_job, retry=self.retry),
+                                key=lambda job: job.created)
+            if len(child_jobs) != len(queries):
+                raise BigqueryJobError("script ran {} statements for {} queries".format(len(child_jobs), len(queries)))
+            results = []
+            for child_job in child_jobs:
+                self._log_job(child_job, "finally")
+                results.append(QueryResult(child_job.result(page_size=RESULT_PAGE_SIZE, retry=self.retry), None,
+                                           child_job, self._get_bqstorage_client))
+        except (GoogleCloudError, Forbidden, BadRequest) as ex:
+            self.writer.write("error", ex.message)
+            logger.error(ex)
+            raise BigqueryJobError(ex.message) from ex
 
+        self._log_job(query_job, "finally")
+
+        if self.on_job_finish is not None:
+            self.on_job_finish(query_job)
+        return results
+
+    def _log_job(self, query_job, stage, state=None):
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        logger.info("Job %s is %s in state %s of %s project", query_job.job_id, stage, state or query_job.state,
+                    query_job.project)
+        if stage != "finally":
+            return
+
+        properties = query_job._properties
+        query_stats = properties.get("statistics", {}).get("query", {})
+        logger.info("Bytes processed: %s, Affected Rows: %s, Bytes billed: %s",
+                    _int_or_none(query_stats.get("estimatedBytesProcessed")),
+                    _int_or_none(query_stats.get("numDmlAffectedRows")),
+                    _int_or_none(query_stats.get("totalBytesBilled")))
+        logger.info("Job labels %s", properties.get("configuration", {}).get("labels", {}))
+
+    def _get_bqstorage_client(self):
+        # built on first use so services that only iterate rows never open a grpc channel
+        if self.bqstorage_client is None:
+            self.bqstorage_client = self.client._create_bqstorage_client()
+        return self.bqstorage_client
+
+    def _wait_for_job(self, query_job, timeout_ms):
+        """Long-polls until the job completes and keeps the final query results on the job for result() to reuse."""
+        query_results = None
+        while query_results is None or not query_results.complete:
+            # getQueryResults holds the request server side until the job completes or the timeout passes
+            query_results = self.client._get_query_results(query_job.job_id,
+                                                           self.retry,
+                                                           project=query_job.project,
+                                                           timeout_ms=timeout_ms,
+                                                           location=query_job.location)
+        query_job._query_results = query_results
+
+    def _post_query(self, query):
+        # created once per query so a retried POST is deduplicated by bigquery instead of running the query again
+        data = {
+            "requestId": str(uuid.uuid4()),
+            "query": query,
+            "useLegacySql": False,
+            "labels": self.labels,
+            # job hooks need a job to register and to read the statistics from
+            "jobCreationMode": "JOB_CREATION_REQUIRED" if self.on_job_register or self.on_job_finish
+            else "JOB_CREATION_OPTIONAL",
+            "timeoutMs": QUERY_TIMEOUT_IN_MS,
+        }
+        return self.client._call_api(self.retry,
+                                     method="POST",
+                                     path="/projects/{}/queries".format(self.client.project),
+                                     data=data)
+
+    def _execute_query_job(self, query):
         logger.info("executing query")
+        # the client merges job_config into a new config, the shared template is never mutated
         query_job = self.client.query(query=query,
-                                      job_config=query_job_config,
+                                      job_config=self._base_query_cfg,
                                       retry=self.retry)
-        logger.info("Job {} is initially in state {} of {} project".format(query_job.job_id, query_job.state,
-                                                                           query_job.project))
+        self._log_job(query_job, "initially")
 
         if self.on_job_register:
             self.on_job_register(self.client, query_job)
 
         try:
-            result = query_job.result()
+            result = query_job.result(page_size=RESULT_PAGE_SIZE, retry=self.retry)
         except (GoogleCloudError, Forbidden, BadRequest) as ex:
             self.writer.write("error", ex.message)
             logger.error(ex)
-            sys.exit(1)
+            raise BigqueryJobError(ex.message) from ex
 
-        logger.info("Job {} is finally in state {} of {} project".format(query_job.job_id, query_job.state,
-                                                                         query_job.project))
-        logger.info("Bytes processed: {}, Affected Rows: {}, Bytes billed: {}".format(query_job.estimated_bytes_processed,
-                                                               query_job.num_dml_affected_rows,
-                                                               query_job.total_bytes_billed))
-        logger.info("Job labels {}".format(query_job._configuration.labels))
+        self._log_job(query_job, "finally")
 
         if self.on_job_finish is not None:
             self.on_job_finish(query_job)
-        return result
+        return QueryResult(result, None, query_job, self._get_bqstorage_client)
 
     def transform_load(self,
                        query,
@@ -120,89 +369,244 @@ class BigqueryService(BaseBigqueryService):
                        write_disposition=None,
                        create_disposition=CreateDisposition.CREATE_NEVER,
                        allow_field_addition=False):
-        if query is None or len(query) == 0:
+        if not query:
             raise ValueError("query must not be Empty")
 
-        query_job_config = QueryJobConfig()
+        base_cfg = self._base_load_cfg_fa if allow_field_addition else self._base_load_cfg_no_fa
+        query_job_config = QueryJobConfig.from_api_repr(base_cfg.to_api_repr())
         query_job_config.create_disposition = create_disposition
         query_job_config.write_disposition = write_disposition
-        query_job_config.use_legacy_sql = False
-        query_job_config.labels = self.labels
-        if allow_field_addition:
-            query_job_config.schema_update_options = [
-                bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION,
-                bigquery.SchemaUpdateOption.ALLOW_FIELD_RELAXATION
-            ]
 
         if destination_table is not None:
-            table_ref = TableReference.from_string(destination_table)
+            table_ref = _table_ref(destination_table)
             query_job_config.destination = table_ref
 
         logger.info("transform load")
         query_job = self.client.query(query=query,
                                       job_config=query_job_config,
                                       retry=self.retry)
-        logger.info("Job {} is initially in state {} of {} project".format(query_job.job_id, query_job.state,
-                                                                           query_job.project))
+        self._log_job(query_job, "initially")
 
         if self.on_job_register:
             self.on_job_register(self.client, query_job)
 
         try:
+            self._wait_for_job(query_job, TRANSFORM_LOAD_POLL_TIMEOUT_IN_MS)
+            # refresh statistics once, result() then returns without polling again
+            query_job.reload(retry=self.retry)
             result = query_job.result()
         except (GoogleCloudError, Forbidden, BadRequest) as ex:
             self.writer.write("error", ex.message)
             logger.error(ex)
-            sys.exit(1)
+            raise BigqueryJobError(ex.message) from ex
 
-        logger.info("Job {} is finally in state {} of {} project".format(query_job.job_id, query_job.state,
-                                                                           query_job.project))
-        logger.info("Bytes processed: {}, Stats: {} {}".format(query_job.estimated_bytes_processed,
-                                                               query_job.num_dml_affected_rows,
-                                                               query_job.total_bytes_billed))
-        logger.info("Job labels {}".format(query_job._configuration.labels))
+        if destination_table is not None:
+            # the load can truncate or add fields to the destination, drop its cached metadata
+            self._invalidate_table(destination_table.split("$")[0])
+
+        self._log_job(query_job, "finally")
 
         if self.on_job_finish is not None:
             self.on_job_finish(query_job)
         return result
 
+    def transform_load_many(self, jobs, max_concurrent=DEFAULT_MAX_CONCURRENT_QUERIES):
+        """Runs transform_load for every job spec concurrently, results are returned in the order of the specs.
+
+        :param jobs: list of keyword arguments for transform_load
+        :param max_concurrent: maximum number of query jobs running at the same time
+        """
+        if not jobs:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_concurrent, len(jobs))) as executor:
+            return list(executor.map(lambda spec: self.transform_load(**spec), jobs))
+
     def create_table(self, full_table_name, schema_file,
                      partitioning_type=TimePartitioningType.DAY,
                      partitioning_field=None):
-        with open(schema_file, 'r') as file:
-            schema_json = json.load(file)
-        table_schema = _parse_schema_resource({'fields': schema_json})
+        table_schema = _load_schema(schema_file, os.path.getmtime(schema_file))
 
-        table_ref = TableReference.from_string(full_table_name)
+        table_ref = _table_ref(full_table_name)
 
         bigquery_table = bigquery.Table(table_ref, table_schema)
         bigquery_table.time_partitioning = TimePartitioning(type_=partitioning_type,
                                                             field=partitioning_field)
 
         self.client.create_table(bigquery_table)
+        self._invalidate_table(full_table_name)
 
     def delete_table(self, full_table_name):
-        table_ref = TableReference.from_string(full_table_name)
-        self.client.delete_table(bigquery.Table(table_ref))
+        table_ref = _table_ref(full_table_name)
+        self.client.delete_table(bigquery.Table(table_ref), retry=self.retry)
+        self._invalidate_table(full_table_name)
 
     def get_table(self, full_table_name):
-        table_ref = TableReference.from_string(full_table_name)
-        return self.client.get_table(table_ref)
+        with self._table_cache_lock:
+            table = self._table_cache.get(full_table_name)
+        if table is not None:
+            return table
+
+        # fetch outside of the lock so lookups of other tables are not blocked by this round-trip
+        table = self._get_table_uncached(full_table_name)
+        with self._table_cache_lock:
+            self._table_cache[full_table_name] = table
+        return table
+
+    def _get_table_uncached(self, full_table_name):
+        table_ref = _table_ref(full_table_name)
+        return self.client.get_table(table_ref, retry=self.retry)
+
+    def get_tables(self, full_table_names):
+        """Gets tables concurrently, returned in the same order as the given names."""
+        return self._map_concurrently(self.get_table, full_table_names)
+
+    def delete_tables(self, full_table_names):
+        self._map_concurrently(self.delete_table, full_table_names)
+
+    def _map_concurrently(self, fn, full_table_names):
+        if not full_table_names:
+            return []
+        with ThreadPoolExecutor(max_workers=min(MAX_TABLE_REQUEST_WORKERS, len(full_table_names))) as executor:
+            return list(executor.map(fn, full_table_names))
+
+    def _invalidate_table(self, full_table_name):
+        with self._table_cache_lock:
+            self._table_cache.pop(full_table_name, None)
+
+
+@functools.lru_cache(maxsize=4096)
+def _table_ref(full_table_name):
+    """Parses a table name once, table references are never modified so cached instances are shared."""
+    return TableReference.from_string(full_table_name)
+
+
+@functools.lru_cache(maxsize=256)
+def _load_schema(schema_file, mtime):
+    """Parses a schema file, the modification time is part of the cache key so edited files are parsed again."""
+    schema_json = orjson.loads(Path(schema_file).read_bytes())
+    return _parse_schema_resource({'fields': schema_json})
+
+
+def _is_cacheable_query(query):
+    statement = query.strip().rstrip(";")
+    return (CACHEABLE_QUERY_PATTERN.match(statement) is not None
+            and ";" not in statement
+            and NON_DETERMINISTIC_QUERY_PATTERN.search(statement) is None)
+
+
+def _can_run_as_script(queries):
+    for query in queries:
+        statement = query.strip().rstrip(";")
+        if ";" in statement or SCRIPT_QUERY_PATTERN.match(statement) is not None:
+            return False
+    return True
+
+
+def _schema_from_query_response(response):
+    return _parse_schema_resource(response.get("schema", {}))
+
+
+def _rows_from_query_response(response):
+    return _rows_from_json(response.get("rows", []), _schema_from_query_response(response))
+
+
+def _statistics_from_query_response(response):
+    return {key: response[key] for key in QUERY_RESPONSE_STATISTICS if key in response}
+
+
+class QueryResult:
+    """Rows of a finished query.
+
+    Iterating gives the rows as before, to_arrow and to_dataframe read the result through
+    the BigQuery Storage Read API when the query ran as a job.
+    """
+
+    def __init__(self, rows, schema, query_job, bqstorage_client_getter, total_rows=None):
+        self.rows = rows
+        self.schema = schema
+        self.query_job = query_job
+        self._bqstorage_client_getter = bqstorage_client_getter
+        self._total_rows = total_rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    @property
+    def total_rows(self):
+        if self._total_rows is not None:
+            return self._total_rows
+        if hasattr(self.rows, "total_rows"):
+            return self.rows.total_rows
+        return len(self.rows)
+
+    def to_arrow(self):
+        if self.query_job is None:
+            return _arrow_from_rows(self.rows, self.schema)
+        return self.query_job.result().to_arrow(bqstorage_client=self._bqstorage_client_getter())
+
+    def to_dataframe(self):
+        if self.query_job is None:
+            return self.to_arrow().to_pandas()
+        return self.query_job.result().to_dataframe(bqstorage_client=self._bqstorage_client_getter())
+
+
+def _arrow_from_rows(rows, schema):
+    """Builds an arrow table from rows returned inline by jobs.query, those never have a table to read from."""
+    import pyarrow
+    from google.cloud.bigquery._pandas_helpers import bq_to_arrow_schema
+
+    columns = {field.name: [row[index] for row in rows] for index, field in enumerate(schema)}
+    return pyarrow.Table.from_pydict(columns, schema=bq_to_arrow_schema(schema))
 
 
 def create_bigquery_service(task_config: TaskConfigFromEnv, labels, writer, on_job_finish = None, on_job_register = None):
     if writer is None:
         writer = writer.StdWriter()
 
+    client = _get_bigquery_client(task_config)
+    return BigqueryService(client, labels, writer, retry_timeout=task_config.retry_timeout, on_job_finish=on_job_finish,
+                           on_job_register=on_job_register, result_cache_ttl=task_config.result_cache_ttl)
+
+
+def _get_bigquery_client(task_config: TaskConfigFromEnv):
+    """Gets a bigquery client shared by every task with the same execution project, priority and field addition."""
+    key = (task_config.execution_project, task_config.query_priority, task_config.allow_field_addition)
+    with _CACHE_LOCK:
+        client = _CLIENT_CACHE.get(key)
+    if client is not None:
+        return client
+
     credentials = _get_bigquery_credentials()
     default_query_job_config = QueryJobConfig()
     default_query_job_config.priority = task_config.query_priority
     default_query_job_config.allow_field_addition = task_config.allow_field_addition
-    client = bigquery.Client(project=task_config.execution_project, credentials=credentials, default_query_job_config=default_query_job_config)
-    return BigqueryService(client, labels, writer, retry_timeout=task_config.retry_timeout, on_job_finish=on_job_finish, on_job_register=on_job_register)
+    client = bigquery.Client(project=task_config.execution_project, credentials=credentials,
+                             default_query_job_config=default_query_job_config,
+                             _http=_create_http_session(credentials))
+    with _CACHE_LOCK:
+        return _CLIENT_CACHE.setdefault(key, client)
+
+
+def _create_http_session(credentials):
+    """Creates an authorized session that keeps a pool of connections open for concurrent requests."""
+    session = AuthorizedSession(credentials)
+    # retries are handled by the api retry predicate, not by urllib3
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=0)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = "gzip"
+    return session
 
 
 def _get_bigquery_credentials():
+    """Gets credentials once per process, credentials refresh their own token when it expires."""
+    global _CREDENTIALS_CACHE
+    with _CACHE_LOCK:
+        if _CREDENTIALS_CACHE is None:
+            _CREDENTIALS_CACHE = _load_bigquery_credentials()
+        return _CREDENTIALS_CACHE
+
+
+def _load_bigquery_credentials():
     """Gets credentials from the BQ_SERVICE_ACCOUNT environment var else GOOGLE_APPLICATION_CREDENTIALS for file path."""
     scope = ('https://www.googleapis.com/auth/bigquery',
              'https://www.googleapis.com/auth/cloud-platform',
@@ -211,7 +615,7 @@ def _get_bigquery_credentials():
     creds = _load_credentials_from_var(account, scope)
     if creds is not None:
         return creds
-    credentials, _ = google.auth.default(scopes=scope)
+    credentials, _ = _google_auth_default(scopes=scope)
     return credentials
 
 
@@ -247,29 +651,33 @@ def _load_credentials_from_var(account_str, scopes=None):
 class DummyService(BaseBigqueryService):
 
     def execute_query(self, query):
-        logger.info("execute query : {}".format(query))
+        logger.info("execute query : %s", query)
         return []
 
+    def execute_queries(self, queries):
+        return [self.execute_query(query) for query in queries]
+
     def transform_load(self, query, source_project_id=None, destination_table=None, write_disposition=None,
                        create_disposition=CreateDisposition.CREATE_NEVER, allow_field_addition=False):
-        log = """ transform and load with config :
-        {}
-        {}
-        {}
-        {}""".format(query, source_project_id, destination_table, write_disposition)
-        logger.info(log)
+        logger.info("transform and load with config: %s %s %s %s", query, source_project_id, destination_table,
+                    write_disposition)
+
+    def transform_load_many(self, jobs, max_concurrent=DEFAULT_MAX_CONCURRENT_QUERIES):
+        return [self.transform_load(**spec) for spec in jobs]
 
     def create_table(self, full_table_name, schema_file, partitioning_type=TimePartitioningType.DAY,
                      partitioning_field=None):
-        log = """ create table with config :
-        {}
-        {}
-        {}
-        {}""".format(full_table_name, schema_file, partitioning_type, partitioning_field)
-        logger.info(log)
+        logger.info("create table with config: %s %s %s %s", full_table_name, schema_file, partitioning_type,
+                    partitioning_field)
 
     def delete_table(self, full_table_name):
-        logger.info("delete table: {}".format(full_table_name))
+        logger.info("delete table: %s", full_table_name)
 
     def get_table(self, full_table_name):
         return Table.from_string(full_table_name)
+
+    def get_tables(self, full_table_names):
+        return [self.get_table(full_table_name) for full_table_name in full_table_names]
+
+    def delete_tables(self, full_table_names):
+        logger.info("delete tables: %s", full_table_names)
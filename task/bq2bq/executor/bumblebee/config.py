@@ -127,6 +127,7 @@ class TaskConfigFromEnv(TaskConfig):
         self._concurrency = _validate_greater_than_zero(int(get_env_config("CONCURRENCY", default=1)))
         self._allow_field_addition = _bool_from_str(get_env_config("ALLOW_FIELD_ADDITION", default="false"))
         self._retry_timeout = get_env_config("RETRY_TIMEOUT_IN_SECONDS", default=None)
+        self._result_cache_ttl = get_env_config("RESULT_CACHE_TTL_IN_SECONDS", default=None)
 
     @property
     def destination_project(self) -> str:
@@ -185,6 +186,12 @@ class TaskConfigFromEnv(TaskConfig):
             return float(self._retry_timeout)
         return None
 
+    @property
+    def result_cache_ttl(self) -> Optional[float]:
+        if self._result_cache_ttl:
+            return float(self._result_cache_ttl)
+        return None
+
     def print(self):
         logger.info("task config:\n{}".format(
             "\n".join([
@@ -356,6 +363,7 @@ class TaskConfigFromFile(TaskConfig):
         self._concurrency = _validate_greater_than_zero(int(self._get_property_or_default("CONCURRENCY", 1)))
         self._allow_field_addition = _bool_from_str(self._get_property_or_default("ALLOW_FIELD_ADDITION", "false"))
         self._retry_timeout = self._get_property_or_default("RETRY_TIMEOUT_IN_SECONDS", None)
+        self._result_cache_ttl = self._get_property_or_default("RESULT_CACHE_TTL_IN_SECONDS", None)
 
     @property
     def sql_type(self) -> str:
@@ -426,6 +434,12 @@ class TaskConfigFromFile(TaskConfig):
             return float(self._retry_timeout)
         return None
 
+    @property
+    def result_cache_ttl(self) -> Optional[float]:
+        if self._result_cache_ttl:
+            return float(self._result_cache_ttl)
+        return None
+
     def print(self):
         logger.info("task config:\n{}".format(
             "\n".join([
@@ -0,0 +1,373 @@
+import json
+import os
+import tempfile
+from unittest import TestCase, mock
+from unittest.mock import MagicMock
+
+import orjson
+import requests.exceptions
+from google.api_core.exceptions import BadRequest, ServiceUnavailable
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import bigquery
+from google.cloud.bigquery.job import QueryJob
+from google.cloud.bigquery.query import _QueryResults
+
+from bumblebee import bigquery_service
+from bumblebee.bigquery_service import BigqueryService, BigqueryJobError, create_bigquery_service
+
+
+class TestBigqueryService(TestCase):
+
+    def setUp(self):
+        self.client = MagicMock()
+        self.writer = MagicMock()
+        self.service = BigqueryService(self.client, {"owner": "optimus"}, self.writer)
+
+    def test_get_table_should_reuse_cached_table(self):
+        first = self.service.get_table("bq_project.playground_dev.abcd")
+        second = self.service.get_table("bq_project.playground_dev.abcd")
+
+        self.assertIs(first, second)
+        self.assertEqual(self.client.get_table.call_count, 1)
+
+    def test_get_table_should_refetch_after_delete_table(self):
+        self.service.get_table("bq_project.playground_dev.abcd")
+        self.service.delete_table("bq_project.playground_dev.abcd")
+        self.service.get_table("bq_project.playground_dev.abcd")
+
+        self.assertEqual(self.client.get_table.call_count, 2)
+
+    def test_get_table_should_refetch_after_transform_load_into_partition(self):
+        self.client._get_query_results.return_value = MagicMock(complete=True)
+
+        self.service.get_table("bq_project.playground_dev.abcd")
+        self.service.transform_load("select 1", destination_table="bq_project.playground_dev.abcd$20190101",
+                                    write_disposition="WRITE_TRUNCATE", allow_field_addition=True)
+        self.service.get_table("bq_project.playground_dev.abcd")
+
+        self.assertEqual(self.client.get_table.call_count, 2)
+
+    def test_execute_query_should_return_inline_rows_when_no_job_created(self):
+        self.client._call_api.return_value = {
+            "jobComplete": True,
+            "queryId": "query_id",
+            "schema": {"fields": [{"name": "dt", "type": "STRING"}]},
+            "rows": [{"f": [{"v": "2019-01-01"}]}, {"f": [{"v": "2019-01-02"}]}],
+            "totalRows": "2",
+        }
+
+        result = self.service.execute_query("select dt from table")
+
+        self.assertEqual([row[0] for row in result], ["2019-01-01", "2019-01-02"])
+        self.assertEqual(result.total_rows, 2)
+        self.client.query.assert_not_called()
+        self.client._get_query_results.assert_not_called()
+
+    @mock.patch.object(QueryJob, "result")
+    @mock.patch.object(QueryJob, "reload")
+    def test_execute_query_should_long_poll_until_job_complete(self, reload_mock, result_mock):
+        self.client._call_api.return_value = {
+            "jobComplete": False,
+            "jobReference": {"projectId": "bq_project", "jobId": "job_id", "location": "US"},
+        }
+        self.client._get_query_results.side_effect = [MagicMock(complete=False), MagicMock(complete=True)]
+
+        result = self.service.execute_query("select dt from table")
+
+        self.assertEqual(self.client._get_query_results.call_count, 2)
+        reload_mock.assert_called_once()
+        self.assertIs(result.rows, result_mock.return_value)
+        self.assertEqual(result_mock.call_args[1]["page_size"], bigquery_service.RESULT_PAGE_SIZE)
+
+    def test_execute_query_should_log_initial_job_state_through_log_job(self):
+        self.client._call_api.return_value = {
+            "jobComplete": True,
+            "jobReference": {"projectId": "bq_project", "jobId": "job_id", "location": "US"},
+        }
+
+        with mock.patch.object(QueryJob, "reload"), \
+                mock.patch.object(BigqueryService, "_log_job") as log_job:
+            self.service.execute_query("select dt from table")
+
+        initial_job, stage, state = log_job.call_args_list[0][0]
+        self.assertEqual(stage, "initially")
+        self.assertEqual(state, "DONE")
+        # the state is not faked on the job, result() would skip checking it for errors
+        self.assertIsNone(initial_job.state)
+
+    def test_execute_query_should_pass_job_created_by_jobs_query_to_job_hooks(self):
+        self.client._call_api.return_value = {
+            "jobComplete": True,
+            "jobReference": {"projectId": "bq_project", "jobId": "job_id", "location": "US"},
+            "totalBytesProcessed": "1024",
+            "totalSlotMs": "200",
+        }
+        on_job_register, on_job_finish = MagicMock(), MagicMock()
+        service = BigqueryService(self.client, {"owner": "optimus"}, self.writer,
+                                  on_job_finish=on_job_finish, on_job_register=on_job_register)
+
+        service.execute_query("merge table t using s on true when matched then delete")
+
+        self.client.query.assert_not_called()
+        # only the jobs.query POST, the complete job is not reloaded
+        self.assertEqual(self.client._call_api.call_count, 1)
+        self.assertEqual(self.client._call_api.call_args[1]["data"]["jobCreationMode"], "JOB_CREATION_REQUIRED")
+        query_job = on_job_finish.call_args[0][0]
+        on_job_register.assert_called_once_with(self.client, query_job)
+        self.assertEqual(query_job.job_id, "job_id")
+        self.assertEqual(query_job.slot_millis, 200)
+        self.assertEqual(query_job.total_bytes_processed, 1024)
+
+    @mock.patch("google.api_core.retry.time.sleep")
+    def test_execute_query_should_reuse_request_id_when_post_is_retried(self, _):
+        client = bigquery.Client(project="bq_project", credentials=AnonymousCredentials())
+        client._connection = MagicMock()
+        client._connection.api_request.side_effect = [requests.exceptions.Timeout(), {"jobComplete": True}]
+        service = BigqueryService(client, {"owner": "optimus"}, self.writer)
+
+        service.execute_query("merge table t using s on true when matched then delete")
+
+        calls = client._connection.api_request.call_args_list
+        self.assertEqual(len(calls), 2)
+        request_ids = [call[1]["data"]["requestId"] for call in calls]
+        self.assertEqual(request_ids[0], request_ids[1])
+
+    def test_execute_query_should_raise_job_error_when_reloaded_job_failed(self):
+        client = bigquery.Client(project="bq_project", credentials=AnonymousCredentials())
+        client._connection = MagicMock()
+        job_reference = {"projectId": "bq_project", "jobId": "job_id", "location": "US"}
+        client._connection.api_request.side_effect = [
+            {"jobComplete": True, "jobReference": job_reference, "pageToken": "token"},
+            {"jobReference": job_reference, "configuration": {"query": {"query": "select 1"}},
+             "status": {"state": "DONE", "errorResult": {"reason": "invalidQuery", "message": "failed"}}},
+        ]
+        service = BigqueryService(client, {"owner": "optimus"}, self.writer)
+
+        with self.assertRaises(BigqueryJobError):
+            service.execute_query("select dt from table")
+
+    def test_get_tables_should_return_tables_in_input_order(self):
+        self.client.get_table.side_effect = lambda table_ref, retry=None: table_ref.table_id
+        names = ["bq_project.playground_dev.table_{}".format(i) for i in range(20)]
+
+        tables = self.service.get_tables(names)
+
+        self.assertEqual(tables, ["table_{}".format(i) for i in range(20)])
+
+    def test_delete_tables_should_delete_every_table(self):
+        self.service.delete_tables(["bq_project.playground_dev.a", "bq_project.playground_dev.b"])
+
+        self.assertEqual(self.client.delete_table.call_count, 2)
+
+    def test_create_table_should_parse_schema_file_once(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            schema_file = os.path.join(tmp_dir, "schema.json")
+            with open(schema_file, "w") as file:
+                json.dump([{"name": "dt", "type": "DATE", "mode": "NULLABLE"}], file)
+
+            with mock.patch("bumblebee.bigquery_service.orjson.loads", wraps=orjson.loads) as loads_mock:
+                self.service.create_table("bq_project.playground_dev.a", schema_file)
+                self.service.create_table("bq_project.playground_dev.b", schema_file)
+
+        loads_mock.assert_called_once()
+        created_table = self.client.create_table.call_args[0][0]
+        self.assertEqual([field.name for field in created_table.schema], ["dt"])
+
+    def test_transform_load_should_long_poll_before_fetching_result(self):
+        query_job = self.client.query.return_value
+        self.client._get_query_results.side_effect = [MagicMock(complete=False), MagicMock(complete=True)]
+
+        result = self.service.transform_load("select 1", destination_table="bq_project.playground_dev.abcd")
+
+        self.assertEqual(self.client._get_query_results.call_count, 2)
+        self.assertEqual(self.client._get_query_results.call_args[1]["timeout_ms"],
+                         bigquery_service.TRANSFORM_LOAD_POLL_TIMEOUT_IN_MS)
+        query_job.reload.assert_called_once()
+        self.assertIs(result, query_job.result.return_value)
+
+    def test_transform_load_result_should_not_fetch_query_results_again(self):
+        job_reference = {"projectId": "bq_project", "jobId": "job_id", "location": "US"}
+        query_job = QueryJob.from_api_repr({"jobReference": job_reference,
+                                            "configuration": {"query": {"query": "select 1"}}}, self.client)
+        self.client.query.return_value = query_job
+        self.client._get_query_results.side_effect = [
+            _QueryResults.from_api_repr({"jobComplete": False, "jobReference": job_reference}),
+            _QueryResults.from_api_repr({"jobComplete": True, "jobReference": job_reference, "totalRows": "0",
+                                         "schema": {"fields": [{"name": "dt", "type": "DATE"}]}}),
+        ]
+
+        def reload(retry=None):
+            destination = {"projectId": "bq_project", "datasetId": "playground_dev", "tableId": "abcd"}
+            query_job._set_properties({"jobReference": job_reference, "status": {"state": "DONE"},
+                                       "configuration": {"query": {"query": "select 1",
+                                                                   "destinationTable": destination}}})
+
+        with mock.patch.object(query_job, "reload", side_effect=reload):
+            result = self.service.transform_load("select 1", destination_table="bq_project.playground_dev.abcd")
+
+        self.assertEqual(self.client._get_query_results.call_count, 2)
+        self.assertIs(result, self.client.list_rows.return_value)
+
+    def test_execute_query_result_should_read_arrow_through_bqstorage_client(self):
+        query_job = MagicMock()
+        self.client._default_query_job_config.priority = "BATCH"
+        self.client.query.return_value = query_job
+
+        result = self.service.execute_query("select dt from table")
+        self.client._create_bqstorage_client.assert_not_called()
+        arrow_table = result.to_arrow()
+
+        bqstorage_client = self.client._create_bqstorage_client.return_value
+        query_job.result.return_value.to_arrow.assert_called_once_with(bqstorage_client=bqstorage_client)
+        self.assertIs(arrow_table, query_job.result.return_value.to_arrow.return_value)
+
+    def test_transform_load_should_not_share_job_config_between_calls(self):
+        self.client._get_query_results.return_value = MagicMock(complete=True)
+
+        self.service.transform_load("select 1", destination_table="bq_project.playground_dev.a",
+                                    write_disposition="WRITE_APPEND", allow_field_addition=True)
+        first_config = self.client.query.call_args[1]["job_config"]
+        self.service.transform_load("select 1", destination_table="bq_project.playground_dev.b",
+                                    write_disposition="WRITE_TRUNCATE")
+        second_config = self.client.query.call_args[1]["job_config"]
+
+        self.assertEqual(first_config.destination.table_id, "a")
+        self.assertEqual(first_config.write_disposition, "WRITE_APPEND")
+        self.assertEqual(len(first_config.schema_update_options), 2)
+        self.assertEqual(second_config.destination.table_id, "b")
+        self.assertEqual(second_config.write_disposition, "WRITE_TRUNCATE")
+        self.assertIsNone(second_config.schema_update_options)
+        self.assertEqual(second_config.labels, {"owner": "optimus"})
+        self.assertFalse(second_config.use_legacy_sql)
+
+    def test_transform_load_many_should_return_results_in_input_order(self):
+        jobs = [{"query": "select {}".format(i), "destination_table": "bq_project.playground_dev.t{}".format(i)}
+                for i in range(10)]
+
+        with mock.patch.object(BigqueryService, "transform_load", side_effect=lambda **spec: spec["query"]):
+            results = self.service.transform_load_many(jobs, max_concurrent=4)
+
+        self.assertEqual(results, ["select {}".format(i) for i in range(10)])
+
+    def test_execute_query_should_reuse_cached_result_of_identical_query(self):
+        service = BigqueryService(self.client, {"owner": "optimus"}, self.writer, result_cache_ttl=60)
+        self.client._call_api.return_value = {
+            "jobComplete": True,
+            "schema": {"fields": [{"name": "dt", "type": "STRING"}]},
+            "rows": [{"f": [{"v": "2019-01-01"}]}],
+        }
+
+        first = service.execute_query("select dt from table")
+        second = service.execute_query("  select dt from table\n")
+
+        self.assertIs(first, second)
+        self.assertEqual([row[0] for row in second], ["2019-01-01"])
+        self.assertEqual(self.client._call_api.call_count, 1)
+
+    def test_execute_query_should_not_cache_dml_or_non_deterministic_query(self):
+        service = BigqueryService(self.client, {"owner": "optimus"}, self.writer, result_cache_ttl=60)
+        self.client._call_api.return_value = {"jobComplete": True}
+
+        for query in ["merge table t using s on true when matched then delete",
+                      "select current_timestamp()",
+                      "select 1; delete from table where true"]:
+            service.execute_query(query)
+            service.execute_query(query)
+
+        self.assertEqual(self.client._call_api.call_count, 6)
+
+    def test_transform_load_should_raise_job_error_when_job_fails(self):
+        self.client._get_query_results.side_effect = BadRequest("invalid query")
+
+        with self.assertRaises(BigqueryJobError) as ex:
+            self.service.transform_load("select 1", destination_table="bq_project.playground_dev.abcd")
+
+        self.assertEqual(str(ex.exception), "invalid query")
+        self.assertIsInstance(ex.exception.__cause__, BadRequest)
+        self.writer.write.assert_called_once_with("error", "invalid query")
+
+    def test_retry_should_only_retry_transient_errors(self):
+        predicate = self.service.retry._predicate
+
+        self.assertTrue(predicate(ServiceUnavailable("unavailable")))
+        self.assertTrue(predicate(requests.exceptions.Timeout()))
+        self.assertTrue(predicate(requests.exceptions.SSLError()))
+        self.assertFalse(predicate(BadRequest("invalid query")))
+        self.assertIs(predicate, BigqueryService(self.client, {}, self.writer, retry_timeout=10).retry._predicate)
+
+    def test_execute_queries_should_submit_one_script(self):
+        first_child, second_child = MagicMock(created=1), MagicMock(created=2)
+        self.client.list_jobs.return_value = [second_child, first_child]
+
+        results = self.service.execute_queries(["select 1 -- first", "delete from table where true"])
+
+        self.client.query.assert_called_once()
+        self.assertEqual(self.client.query.call_args[1]["query"], "select 1 -- first\n;\ndelete from table where true")
+        self.assertEqual([result.query_job for result in results], [first_child, second_child])
+
+    def test_execute_queries_should_reject_empty_query(self):
+        with self.assertRaises(ValueError):
+            self.service.execute_queries(["select 1", "  "])
+
+        self.client.query.assert_not_called()
+
+    def test_execute_queries_should_raise_when_child_jobs_do_not_match_queries(self):
+        self.client.list_jobs.return_value = [MagicMock(created=1)]
+
+        with self.assertRaises(BigqueryJobError):
+            self.service.execute_queries(["select 1", "select 2"])
+
+    def test_execute_queries_should_submit_individually_when_query_is_a_script(self):
+        with mock.patch.object(BigqueryService, "execute_query", side_effect=lambda query: query) as execute_query:
+            results = self.service.execute_queries(["declare x int64; select x", "select 2"])
+
+        self.assertEqual(results, ["declare x int64; select x", "select 2"])
+        self.assertEqual(execute_query.call_count, 2)
+        self.client.query.assert_not_called()
+
+
+class TestCreateBigqueryService(TestCase):
+
+    def setUp(self):
+        bigquery_service._CREDENTIALS_CACHE = None
+        bigquery_service._CLIENT_CACHE.clear()
+
+    @mock.patch("bumblebee.bigquery_service._load_bigquery_credentials")
+    @mock.patch("bumblebee.bigquery_service.bigquery.Client")
+    def test_create_bigquery_service_should_reuse_client_and_credentials(self, client_mock, load_credentials_mock):
+        task_config = MagicMock(execution_project="bq_project", query_priority="INTERACTIVE",
+                                allow_field_addition=False, retry_timeout=None,
+                                result_cache_ttl=None)
+
+        first = create_bigquery_service(task_config, {}, MagicMock())
+        second = create_bigquery_service(task_config, {}, MagicMock())
+
+        self.assertIsNot(first, second)
+        self.assertIs(first.client, second.client)
+        client_mock.assert_called_once()
+        load_credentials_mock.assert_called_once()
+
+    @mock.patch("bumblebee.bigquery_service._load_bigquery_credentials")
+    @mock.patch("bumblebee.bigquery_service.bigquery.Client")
+    def test_create_bigquery_service_should_use_pooled_http_session(self, client_mock, load_credentials_mock):
+        task_config = MagicMock(execution_project="bq_project", query_priority="INTERACTIVE",
+                                allow_field_addition=False, retry_timeout=None,
+                                result_cache_ttl=None)
+
+        create_bigquery_service(task_config, {}, MagicMock())
+
+        session = client_mock.call_args[1]["_http"]
+        adapter = session.get_adapter("https://bigquery.googleapis.com")
+        self.assertEqual(adapter._pool_maxsize, bigquery_service.HTTP_POOL_MAXSIZE)
+        self.assertEqual(session.headers["Accept-Encoding"], "gzip")
+
+    @mock.patch.dict(os.environ, {}, clear=True)
+    @mock.patch("bumblebee.bigquery_service._google_auth_default")
+    def test_application_default_credentials_should_be_discovered_once(self, google_auth_default_mock):
+        google_auth_default_mock.return_value = (MagicMock(), "bq_project")
+
+        first = bigquery_service._get_bigquery_credentials()
+        second = bigquery_service._get_bigquery_credentials()
+
+        self.assertIs(first, second)
+        google_auth_default_mock.assert_called_once()
@@ -166,6 +166,16 @@ class TestConfig(TestCase):
         config = TaskConfigFromEnv()
         self.assertEqual(config.retry_timeout, 120.0)
 
+    def test_result_cache_ttl(self):
+        self.set_vars_with_default()
+        config = TaskConfigFromEnv()
+        self.assertEqual(config.result_cache_ttl, None)
+
+        os.environ['RESULT_CACHE_TTL_IN_SECONDS'] = "300"
+        config = TaskConfigFromEnv()
+        self.assertEqual(config.result_cache_ttl, 300.0)
+        del os.environ['RESULT_CACHE_TTL_IN_SECONDS']
+
     def test_concurrency_should_not_zero_exception(self):
         self.set_vars_with_default()
         os.environ['CONCURRENCY'] = "0"
@@ -222,6 +222,31 @@ class TestTransformationTask(TestCase):
         final_query = """select count(1) from table where date >= '2019-01-02' and date < '2019-01-03'"""
         bigquery_service.execute_query.assert_called_with(final_query)
 
+    def test_merge_replace_transform_should_log_total_rows_of_merge_result(self):
+        query = """select count(1) from table where date >= '__dstart__' and date < '__dend__'"""
+
+        set_vars_with_default(load_method="REPLACE_MERGE")
+        os.environ['PARTITION_FILTER'] = "date = '2019-01-01'"
+        task_config = TaskConfigFromEnv()
+        del os.environ['PARTITION_FILTER']
+        execution_time = localise_datetime(datetime(2019, 1, 1), task_config.timezone)
+
+        client = MagicMock()
+        client._call_api.return_value = {
+            "jobComplete": True,
+            "jobReference": {"projectId": "bq_project", "jobId": "job_id", "location": "US"},
+            "numDmlAffectedRows": "3",
+            "totalSlotMs": "200",
+        }
+        bigquery_service = BigqueryService(client, {"owner": "optimus"}, MagicMock(),
+                                           on_job_finish=MagicMock(), on_job_register=MagicMock())
+        task = MergeReplaceTransformation(bigquery_service, task_config, query, ["date", "count"], "date", "DATE",
+                                          False, execution_time)
+        with mock.patch("bumblebee.transformation.logger") as logger:
+            task.transform()
+
+        logger.info.assert_called_with("finished 0")
+
     @mock.patch("bumblebee.bigquery_service.BigqueryService")
     def test_execute_dry_run(self, BigqueryServiceMock):
         query = """select count(1) from table where date >= '__dstart__' and date < '__dend__'"""